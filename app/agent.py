@@ -6,9 +6,9 @@ from typing import Any, Dict, Iterator, List
 
 from openai import OpenAI
 
+from app import snapshot
 from app import tools as local_tools
 from app.tools import TOOLS
-from app.db import USERS_BY_ID
 from app.prompt import build_system_prompt
 
 logger = logging.getLogger("app.agent")
@@ -42,19 +42,20 @@ def _tool_call_to_input_item(call: Any) -> Dict[str, Any]:
     }
 
 
-def _call_local_tool(name: str, args: dict, user_id: str | None) -> dict:
+def _call_local_tool(name: str, args: dict, user_id: str | None, catalog: snapshot.Catalog) -> dict:
     """Execute a local tool by name with args, returning its output dict."""
     # user_id comes from the dropdown; do not rely on model-supplied user_id
     if name == "get_medication":
-        return local_tools.get_medication(args.get("query", ""))
+        return local_tools.get_medication(args.get("query", ""), catalog=catalog)
 
     if name == "get_user_prescriptions":
-        return local_tools.get_user_prescriptions(user_id or "")
+        return local_tools.get_user_prescriptions(user_id or "", catalog=catalog)
 
     if name == "list_medications":
         return local_tools.list_medications(
             rx_filter=args.get("rx_filter", "both"),
             stock_filter=args.get("stock_filter", "both"),
+            catalog=catalog,
         )
 
     raise RuntimeError(f"Unknown tool requested: {name}")
@@ -69,7 +70,9 @@ def stream_chat(conversation: List[dict], user_id: str | None) -> Iterator[str]:
     """
     messages: List[Dict[str, Any]] = _conversation_to_messages(conversation)
 
-    user = USERS_BY_ID.get((user_id or "").strip()) if user_id else None
+    # One catalog for the whole turn, so the prompt and every tool call see the same generation
+    catalog = snapshot.current()
+    user = catalog.user_by_id((user_id or "").strip()) if user_id else None
     user_name = (user.get("full_name") if user else None) or "there"
     system_prompt = build_system_prompt(user_name)
 
@@ -118,7 +121,7 @@ def stream_chat(conversation: List[dict], user_id: str | None) -> Iterator[str]:
                 args = {}
 
             try:
-                result = _call_local_tool(name, args, user_id)
+                result = _call_local_tool(name, args, user_id, catalog)
             except Exception as e:
                 logger.exception("Tool execution failed: %s", name)
                 result = {"ok": False, "error": str(e)}
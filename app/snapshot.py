@@ -0,0 +1,382 @@
+# app/snapshot.py
+# Shared, memory-mapped catalog snapshot for multi-worker deployments.
+#
+# `uvicorn app.main:app --workers N` gives every worker its own copy of the
+# catalog. With CATALOG_SNAPSHOT set, the catalog is instead written once to a
+# compact binary file and mmap'ed read-only by every worker, so the pages are
+# shared through the OS page cache. Records are decoded on access only.
+#
+# Publishing a new snapshot (e.g. after a stock change) writes a new file with
+# generation+1 and atomically renames it over the old one. Workers notice the
+# new file on their next lookup and swap to it without a restart; requests
+# already holding the previous snapshot keep reading its (still mapped) pages.
+#
+# File layout (little-endian, all offsets absolute):
+#   header   magic, version, generation, n_meds, n_users, section offsets
+#   meds     (n_meds + 1) u64 offsets, then compact JSON records
+#   users    (n_users + 1) u64 offsets, then compact JSON records
+#   med_ids  n_meds  (key_off u64, key_len u32, idx u32) sorted by key, then keys
+#   user_ids n_users (key_off u64, key_len u32, idx u32) sorted by key, then keys
+#   names    (n_meds + 1) u64 offsets, then "\x1f"-joined normalized names
+#   bits     rx_required bitset, then in_stock bitset (ceil(n_meds / 8) bytes each)
+#
+# Build a snapshot from app/db.py with:
+#   python -m app.snapshot build /path/to/catalog.snap
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import Iterator
+
+logger = logging.getLogger("app.snapshot")
+
+SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT", "")
+CHECK_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_CHECK_SECONDS", "1.0"))
+
+MAGIC = b"PHRMSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIQII6Q")
+SPAN = struct.Struct("<QQ")
+INDEX_ENTRY = struct.Struct("<QII")
+NAME_SEP = "\x1f"
+_INVERT = bytes(~b & 0xFF for b in range(256))
+
+
+def normalize_name(s: str) -> str:
+    """Lowercase + trim + collapse whitespace. Used for both the name index and tool queries."""
+    return " ".join((s or "").strip().lower().split())
+
+
+def _med_names(med: dict) -> list[str]:
+    """Normalized brand/generic/alias names, in the order tools match them."""
+    names = [normalize_name(med.get("brand_name", "")), normalize_name(med.get("generic_name", ""))]
+    names += [normalize_name(a) for a in (med.get("aliases") or [])]
+    return [n for n in names if n]
+
+
+def _bitset(flags: list[bool]) -> bytes:
+    out = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            out[i >> 3] |= 1 << (i & 7)
+    return bytes(out)
+
+
+# ----------------------------
+# Catalog views
+# Both expose the same read-only API so tools don't care where data lives.
+# ----------------------------
+class MemoryCatalog:
+    """
+    Catalog view over the in-process lists in app/db.py (default, single worker).
+    app.db is imported on first use only, so snapshot workers never build the Python catalog.
+    """
+
+    generation = 0
+
+    @staticmethod
+    def _db():
+        from app import db
+
+        return db
+
+    def meds(self) -> Iterator[dict]:
+        return iter(self._db().MEDS)
+
+    def users(self) -> list[dict]:
+        return list(self._db().USERS)
+
+    def med_by_id(self, medication_id: str) -> dict | None:
+        return self._db().MEDS_BY_ID.get(medication_id)
+
+    def user_by_id(self, user_id: str) -> dict | None:
+        return self._db().USERS_BY_ID.get(user_id)
+
+    def find_med(self, text: str) -> dict | None:
+        """Return the first medication with a name that appears in normalized text."""
+        for med in self._db().MEDS:
+            if any(name in text for name in _med_names(med)):
+                return med
+        return None
+
+    def filter_meds(self, rx_required: bool | None, in_stock: bool | None) -> Iterator[dict]:
+        for med in self._db().MEDS:
+            if rx_required is not None and bool(med.get("rx_required")) != rx_required:
+                continue
+            if in_stock is not None and bool(med.get("in_stock", True)) != in_stock:
+                continue
+            yield med
+
+
+class Snapshot:
+    """Read-only, memory-mapped catalog snapshot."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < HEADER.size:
+            raise ValueError(f"snapshot too small: {path}")
+        (
+            magic, version, self.generation, self.n_meds, self.n_users,
+            self._meds, self._users, self._med_ids, self._user_ids, self._names, self._bits,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a v{VERSION} catalog snapshot: {path}")
+        # Sections are written in header order with the bitsets last.
+        sections = (self._meds, self._users, self._med_ids, self._user_ids, self._names, self._bits)
+        bits_end = self._bits + 2 * ((self.n_meds + 7) // 8)
+        if list(sections) != sorted(sections) or bits_end > len(self._mm):
+            raise ValueError(f"truncated catalog snapshot: {path}")
+
+        self.path = path
+        self.file_id = (st.st_ino, st.st_mtime_ns)
+
+    def _blob(self, table: int, i: int) -> bytes:
+        start, end = SPAN.unpack_from(self._mm, table + i * 8)
+        return self._mm[start:end]
+
+    def _lookup(self, index: int, count: int, key: str) -> int | None:
+        """Binary search a sorted id index; returns the record position or None."""
+        k = key.encode("utf-8")
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            off, length, idx = INDEX_ENTRY.unpack_from(self._mm, index + mid * INDEX_ENTRY.size)
+            probe = self._mm[off:off + length]
+            if probe == k:
+                return idx
+            if probe < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def med(self, i: int) -> dict:
+        return json.loads(self._blob(self._meds, i))
+
+    def meds(self) -> Iterator[dict]:
+        return (self.med(i) for i in range(self.n_meds))
+
+    def users(self) -> list[dict]:
+        return [json.loads(self._blob(self._users, i)) for i in range(self.n_users)]
+
+    def med_by_id(self, medication_id: str) -> dict | None:
+        i = self._lookup(self._med_ids, self.n_meds, medication_id)
+        return None if i is None else self.med(i)
+
+    def user_by_id(self, user_id: str) -> dict | None:
+        i = self._lookup(self._user_ids, self.n_users, user_id)
+        return None if i is None else json.loads(self._blob(self._users, i))
+
+    def find_med(self, text: str) -> dict | None:
+        """Scan the name index; only the matching record is decoded."""
+        for i in range(self.n_meds):
+            names = self._blob(self._names, i).decode("utf-8")
+            if names and any(name in text for name in names.split(NAME_SEP)):
+                return self.med(i)
+        return None
+
+    def filter_meds(self, rx_required: bool | None, in_stock: bool | None) -> Iterator[dict]:
+        """Combine the filter bitsets, then decode only the selected records."""
+        for i in self._select(rx_required, in_stock):
+            yield self.med(i)
+
+    def _select(self, rx_required: bool | None, in_stock: bool | None) -> Iterator[int]:
+        """Record positions matching the filters, from the bitsets alone."""
+        if rx_required is None and in_stock is None:
+            yield from range(self.n_meds)
+            return
+
+        nbytes = (self.n_meds + 7) // 8
+        selected = -1
+        for flag, offset in ((rx_required, self._bits), (in_stock, self._bits + nbytes)):
+            if flag is None:
+                continue
+            bits = self._mm[offset:offset + nbytes]
+            selected &= int.from_bytes(bits if flag else bits.translate(_INVERT), "little")
+
+        # Walk set bits a byte at a time; padding bits past n_meds can be set by the inversion.
+        for byte_index, byte in enumerate(selected.to_bytes(nbytes, "little")):
+            while byte:
+                low = byte & -byte
+                i = (byte_index << 3) + low.bit_length() - 1
+                if i >= self.n_meds:
+                    return
+                yield i
+                byte ^= low
+
+
+# Either view; what current() hands to tools.
+Catalog = MemoryCatalog | Snapshot
+
+
+# ----------------------------
+# Writer
+# ----------------------------
+def _put_blobs(buf: bytearray, blobs: list[bytes]) -> int:
+    """Append an offset table followed by the blobs; returns the table offset."""
+    start = len(buf)
+    pos = start + (len(blobs) + 1) * 8
+    offsets = [pos]
+    for b in blobs:
+        pos += len(b)
+        offsets.append(pos)
+    buf += struct.pack(f"<{len(offsets)}Q", *offsets)
+    for b in blobs:
+        buf += b
+    return start
+
+
+def _put_index(buf: bytearray, keys: list[str]) -> int:
+    """Append a sorted id index followed by the key bytes; returns the index offset."""
+    start = len(buf)
+    entries = sorted((k.encode("utf-8"), i) for i, k in enumerate(keys))
+    pos = start + len(entries) * INDEX_ENTRY.size
+    for k, i in entries:
+        buf += INDEX_ENTRY.pack(pos, len(k), i)
+        pos += len(k)
+    for k, _ in entries:
+        buf += k
+    return start
+
+
+def _read_generation(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            magic, version, generation, *_ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return generation if magic == MAGIC and version == VERSION else 0
+
+
+def _umask() -> int:
+    # The only way to read the umask is to set it, so put it straight back.
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def write_snapshot(path: str, meds: list[dict], users: list[dict], generation: int | None = None) -> int:
+    """
+    Write a snapshot and atomically replace `path` with it.
+    By default the generation is one past the snapshot currently at `path`.
+    Returns the generation written.
+    """
+    if generation is None:
+        generation = _read_generation(path) + 1
+
+    def _record(obj: dict) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    buf = bytearray(HEADER.size)
+    meds_off = _put_blobs(buf, [_record(m) for m in meds])
+    users_off = _put_blobs(buf, [_record(u) for u in users])
+    med_ids_off = _put_index(buf, [m["medication_id"] for m in meds])
+    user_ids_off = _put_index(buf, [u["user_id"] for u in users])
+    names_off = _put_blobs(buf, [NAME_SEP.join(_med_names(m)).encode("utf-8") for m in meds])
+    bits_off = len(buf)
+    buf += _bitset([bool(m.get("rx_required")) for m in meds])
+    buf += _bitset([bool(m.get("in_stock", True)) for m in meds])
+
+    HEADER.pack_into(
+        buf, 0, MAGIC, VERSION, generation, len(meds), len(users),
+        meds_off, users_off, med_ids_off, user_ids_off, names_off, bits_off,
+    )
+
+    # Write next to the target so os.replace is an atomic rename on the same filesystem.
+    fd, tmp = tempfile.mkstemp(prefix=".catalog-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(buf)
+            f.flush()
+            # mkstemp creates 0600; workers often run as a different user than the writer.
+            os.fchmod(f.fileno(), 0o644 & ~_umask())
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    logger.info("wrote catalog snapshot %s generation=%d meds=%d users=%d", path, generation, len(meds), len(users))
+    return generation
+
+
+# ----------------------------
+# Active catalog (per worker)
+# ----------------------------
+_MEMORY = MemoryCatalog()
+_lock = threading.Lock()
+_active: Snapshot | None = None
+_next_check = 0.0
+_warned = False  # a missing/bad snapshot is logged once, not on every check
+_rejected: tuple[int, int] | None = None  # file id of the last snapshot that failed to load
+
+
+def _reload() -> None:
+    """Swap to the snapshot at SNAPSHOT_PATH if it's a different file than the active one."""
+    global _active, _warned, _rejected
+    fallback = f"keeping generation {_active.generation}" if _active else "using in-memory db"
+    try:
+        st = os.stat(SNAPSHOT_PATH)
+    except OSError as e:
+        if not _warned:
+            logger.warning("catalog snapshot unavailable (%s); %s", e, fallback)
+            _warned = True
+        return
+
+    file_id = (st.st_ino, st.st_mtime_ns)
+    if file_id == _rejected or (_active is not None and _active.file_id == file_id):
+        return
+
+    try:
+        snap = Snapshot(SNAPSHOT_PATH)
+    except (OSError, ValueError) as e:
+        logger.warning("failed to load catalog snapshot (%s); %s", e, fallback)
+        _rejected = file_id
+        return
+
+    # Plain reference swap: callers that already hold the old snapshot keep using it,
+    # and its mapping is released once the last reference goes away.
+    _active = snap
+    _warned = False
+    logger.info("catalog snapshot generation=%d loaded (pid=%d)", snap.generation, os.getpid())
+
+
+def current() -> Catalog:
+    """
+    Return the catalog to read from for this request.
+    Callers should fetch it once per operation so they see a single generation.
+    """
+    global _next_check
+    if not SNAPSHOT_PATH:
+        return _MEMORY
+
+    now = time.monotonic()
+    if now >= _next_check:
+        with _lock:
+            if now >= _next_check:
+                _reload()
+                _next_check = now + CHECK_SECONDS
+
+    return _active or _MEMORY
+
+
+if __name__ == "__main__":
+    from app import db
+
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        sys.exit("usage: python -m app.snapshot build [PATH]")
+
+    logging.basicConfig(level="INFO", format="%(levelname)s: %(name)s - %(message)s")
+    target = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_PATH
+    if not target:
+        sys.exit("no snapshot path given (pass PATH or set CATALOG_SNAPSHOT)")
+    write_snapshot(target, db.MEDS, db.USERS)
@@ -2,7 +2,7 @@
 import logging
 from typing import Any, Literal
 
-from app.db import MEDS, USERS_BY_ID, MEDS_BY_ID
+from app import snapshot
 
 logger = logging.getLogger("app.tools")
 
@@ -71,54 +71,35 @@ TOOLS: list[dict[str, Any]] = [
 ]
 
 
-def _norm(s: str) -> str:
-    """Lowercase + trim + collapse whitespace."""
-    return " ".join((s or "").strip().lower().split())
-
-
-def _find_medication_in_text(text: str) -> dict | None:
+def _find_medication_in_text(catalog: snapshot.Catalog, text: str) -> dict | None:
     """Return the first medication whose brand/generic/alias appears in text (substring match)."""
-    t = _norm(text)
+    t = snapshot.normalize_name(text)
     if not t:
         return None
 
-    for med in MEDS:
-        brand = _norm(med.get("brand_name", ""))
-        generic = _norm(med.get("generic_name", ""))
-
-        if brand and brand in t:
-            return med
-        if generic and generic in t:
-            return med
+    return catalog.find_med(t)
 
-        for a in (med.get("aliases") or []):
-            aa = _norm(a)
-            if aa and aa in t:
-                return med
 
-    return None
-
-
-def _get_user(user_id: str) -> tuple[dict | None, dict | None]:
+def _get_user(catalog: snapshot.Catalog, user_id: str) -> tuple[dict | None, dict | None]:
     """Resolve a demo user by id; returns (user, error_dict)."""
     uid = (user_id or "").strip()
     if not uid:
         return None, {"ok": False, "error_code": "MISSING_USER_ID"}
 
-    user = USERS_BY_ID.get(uid)
+    user = catalog.user_by_id(uid)
     if not user:
         return None, {"ok": False, "error_code": "USER_NOT_FOUND"}
 
     return user, None
 
 
-def _get_medication(query: str) -> tuple[dict | None, dict | None]:
+def _get_medication(catalog: snapshot.Catalog, query: str) -> tuple[dict | None, dict | None]:
     """Resolve a demo medication from free-text; returns (med, error_dict)."""
     q = (query or "").strip()
     if not q:
         return None, {"ok": False, "error_code": "MISSING_MEDICATION_QUERY"}
 
-    med = _find_medication_in_text(q)
+    med = _find_medication_in_text(catalog, q)
     if not med:
         return None, {"ok": False, "error_code": "MED_NOT_FOUND"}
 
@@ -143,7 +124,7 @@ def _med_summary(med: dict) -> dict:
     }
 
 
-def get_medication(query: str) -> dict:
+def get_medication(query: str, catalog: snapshot.Catalog | None = None) -> dict:
     """
     Tool: get_medication
     Purpose: Return factual medication data from the demo DB (ingredients, warnings, dosage text, Rx requirement, stock).
@@ -153,7 +134,7 @@ def get_medication(query: str) -> dict:
     """
     logger.info("get_medication query=%r", query)
 
-    med, err = _get_medication(query)
+    med, err = _get_medication(catalog or snapshot.current(), query)
     if err:
         return err
 
@@ -176,7 +157,7 @@ def get_medication(query: str) -> dict:
     }
 
 
-def get_user_prescriptions(user_id: str) -> dict:
+def get_user_prescriptions(user_id: str, catalog: snapshot.Catalog | None = None) -> dict:
     """
     Tool: get_user_prescriptions
     Purpose: Return the selected demo user's prescriptions as medication summaries.
@@ -186,13 +167,14 @@ def get_user_prescriptions(user_id: str) -> dict:
     """
     logger.info("get_user_prescriptions user_id=%r", user_id)
 
-    user, err = _get_user(user_id)
+    catalog = catalog or snapshot.current()
+    user, err = _get_user(catalog, user_id)
     if err:
         return err
 
     prescriptions: list[dict] = []
     for mid in (user.get("prescribed_medications") or []):
-        m = MEDS_BY_ID.get(mid)
+        m = catalog.med_by_id(mid)
         if m:
             prescriptions.append(_med_summary(m))
 
@@ -206,29 +188,23 @@ def get_user_prescriptions(user_id: str) -> dict:
 def list_medications(
     rx_filter: Literal["rx", "non_rx", "both"] | None = None,
     stock_filter: Literal["in_stock", "out_of_stock", "both"] | None = None,
+    catalog: snapshot.Catalog | None = None,
 ) -> dict:
     """
     Tool: list_medications
     Purpose: List medications in the demo DB with optional filters.
       - rx_filter: rx / non_rx / both (or None => both)
       - stock_filter: in_stock / out_of_stock / both (or None => both)
+      - catalog: catalog to read (None => snapshot.current(), fetched once per call)
     """
     rx_filter = rx_filter or "both"
     stock_filter = stock_filter or "both"
     logger.info("list_medications rx_filter=%s stock_filter=%s", rx_filter, stock_filter)
 
-    def _rx_ok(m: dict) -> bool:
-        rx = bool(m.get("rx_required"))
-        return True if rx_filter == "both" else (rx if rx_filter == "rx" else (not rx))
-
-    def _stock_ok(m: dict) -> bool:
-        st = bool(m.get("in_stock", True))
-        return True if stock_filter == "both" else (st if stock_filter == "in_stock" else (not st))
+    rx_required = None if rx_filter == "both" else rx_filter == "rx"
+    in_stock = None if stock_filter == "both" else stock_filter == "in_stock"
 
-    meds: list[dict] = []
-    for med in MEDS:
-        summary = _med_summary(med)
-        if _rx_ok(summary) and _stock_ok(summary):
-            meds.append(summary)
+    catalog = catalog or snapshot.current()
+    meds = [_med_summary(med) for med in catalog.filter_meds(rx_required, in_stock)]
 
     return {"ok": True, "medications": meds}
\ No newline at end of file
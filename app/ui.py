@@ -1,7 +1,7 @@
 # app/ui.py
 import gradio as gr
 
-from app.db import USERS
+from app import snapshot
 from app.agent import stream_chat
 
 WELCOME = (
@@ -9,9 +9,16 @@ WELCOME = (
     "Ask me about our medications, your prescriptions, or anything else related to your pharmacy needs. "
 )
 
+
+def _user_dropdown_values() -> tuple[list[tuple[str, str]], str]:
+    """Dropdown choices + default user, read from the active catalog (follows snapshot swaps)."""
+    users = snapshot.current().users()
+    choices = [(f"{u['full_name']} ({u['user_id']})", u["user_id"]) for u in users]
+    return choices, (users[0]["user_id"] if users else "")
+
+
 def mount_ui(app):
-    user_choices = [(f"{u['full_name']} ({u['user_id']})", u["user_id"]) for u in USERS]
-    default_user_id = USERS[0]["user_id"] if USERS else ""
+    user_choices, default_user_id = _user_dropdown_values()
 
     initial_history = [{"role": "assistant", "content": WELCOME}]
 
@@ -42,4 +49,11 @@ def mount_ui(app):
             chatbot=gr.Chatbot(value=initial_history),
         )
 
+        # Re-read the user list on every page load so it matches the snapshot the tools use
+        def _refresh_users():
+            choices, default = _user_dropdown_values()
+            return gr.Dropdown(choices=choices, value=default)
+
+        demo.load(fn=_refresh_users, outputs=[user_id])
+
     return gr.mount_gradio_app(app, demo, path="/ui")
\ No newline at end of file
@@ -0,0 +1,185 @@
+# bench/snapshot_bench.py
+# Compare per-worker memory of the in-memory catalog vs the shared mmap snapshot,
+# and measure how long publishing + picking up a new snapshot generation takes.
+# Swap latency is measured in separate worker processes polling at the default
+# CATALOG_SNAPSHOT_CHECK_SECONDS, so it includes the wait for the next check.
+#
+# Run from the repo root (Linux, reads /proc for memory stats):
+#   python -m bench.snapshot_bench --meds 200000 --workers 4
+#
+# RSS counts shared snapshot pages in every worker; PSS splits them between the
+# workers mapping them, so PSS is the number that shows the saving.
+#
+# Memory-mode workers hold the n-med catalog as Python objects, as app/db.py would.
+# Snapshot-mode workers import the tools the way the app does and check that
+# app.db was never imported, so they really don't pay for the Python catalog.
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from app import snapshot
+
+
+def synthetic_catalog(n: int) -> list[dict]:
+    """Scale the demo catalog up to n medications with unique ids and names."""
+    from app import db
+
+    meds = []
+    for i in range(n):
+        base = db.MEDS[i % len(db.MEDS)]
+        med = dict(base)
+        med["medication_id"] = f"m{i:07d}"
+        med["brand_name"] = f"{base['brand_name']} {i}"
+        med["generic_name"] = f"{base['generic_name']} {i}"
+        med["aliases"] = [f"{a} {i}" for a in base["aliases"]]
+        med["active_ingredients"] = list(base["active_ingredients"])
+        med["in_stock"] = i % 3 != 0
+        meds.append(med)
+    return meds
+
+
+def _memory_kb() -> dict[str, int]:
+    """VmRSS from /proc/self/status and Pss from /proc/self/smaps_rollup, in kB."""
+    out = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                out["rss"] = int(line.split()[1])
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    out["pss"] = int(line.split()[1])
+    except OSError:
+        out["pss"] = out["rss"]
+    return out
+
+
+def _worker(mode: str, n: int, path: str, ready, go, results) -> None:
+    if mode == "memory":
+        # What each uvicorn worker does today: hold the records + id index as Python objects.
+        meds = synthetic_catalog(n)
+        by_id = {m["medication_id"]: m for m in meds}
+        touched = sum(1 for m in meds if m["in_stock"]) + len(by_id)
+    else:
+        # app.snapshot is already imported by this module, so point it at the file directly.
+        snapshot.SNAPSHOT_PATH = path
+        from app import tools
+
+        # Touch every record and index page so they're resident, like a warm worker.
+        tools.get_user_prescriptions("u001")
+        touched = len(tools.list_medications(None, "in_stock")["medications"])
+        tools.get_medication("no such medication")
+        assert "app.db" not in sys.modules, "snapshot worker imported the in-memory catalog"
+
+    # Measure only once every worker has loaded, so shared pages are counted as shared.
+    ready.wait()
+    go.wait()
+    results.put((mode, touched, _memory_kb()))
+    ready.wait()
+
+
+def bench_memory(n: int, workers: int, path: str) -> None:
+    ctx = mp.get_context("spawn")
+    for mode in ("memory", "snapshot"):
+        ready = ctx.Barrier(workers + 1)
+        go = ctx.Barrier(workers + 1)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(mode, n, path, ready, go, results)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        ready.wait()
+        go.wait()
+        stats = [results.get()[2] for _ in procs]
+        ready.wait()
+        for p in procs:
+            p.join()
+
+        rss = statistics.mean(s["rss"] for s in stats) / 1024
+        pss = statistics.mean(s["pss"] for s in stats) / 1024
+        print(f"{mode:>8}: workers={workers} meds={n} rss/worker={rss:8.1f} MiB pss/worker={pss:8.1f} MiB")
+
+
+def _poller(path: str, poll_seconds: float, ready, stop, results) -> None:
+    """A worker serving requests: calls current() every poll_seconds and reports new generations."""
+    snapshot.SNAPSHOT_PATH = path
+    seen = snapshot.current().generation
+    ready.wait()
+    while not stop.is_set():
+        t0 = time.monotonic()
+        generation = snapshot.current().generation
+        if generation != seen:
+            t1 = time.monotonic()
+            results.put((generation, t1, (t1 - t0) * 1000))
+            seen = generation
+        time.sleep(poll_seconds)
+
+
+def bench_swap(meds: list[dict], users: list[dict], path: str, rounds: int, workers: int, poll_ms: float) -> None:
+    """
+    Publish new generations from this process and time how long separate worker processes take
+    to serve them. Workers keep the default CATALOG_SNAPSHOT_CHECK_SECONDS, which dominates pickup.
+    """
+    ctx = mp.get_context("spawn")
+    ready = ctx.Barrier(workers + 1)
+    stop = ctx.Event()
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_poller, args=(path, poll_ms / 1000, ready, stop, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    ready.wait()
+
+    write_ms, pickup_ms, load_ms = [], [], []
+    for _ in range(rounds):
+        t0 = time.monotonic()
+        generation = snapshot.write_snapshot(path, meds, users)
+        published = time.monotonic()  # os.replace has returned: the new file is visible
+        write_ms.append((published - t0) * 1000)
+        for _ in procs:
+            seen, t, load = results.get()
+            assert seen == generation, (seen, generation)
+            pickup_ms.append((t - published) * 1000)
+            load_ms.append(load)
+
+    stop.set()
+    for p in procs:
+        p.join()
+
+    print(
+        f"    swap: rounds={rounds} workers={workers} check_interval={snapshot.CHECK_SECONDS:.2f} s "
+        f"request_interval={poll_ms:.0f} ms\n"
+        f"          publish (write + rename) p50={statistics.median(write_ms):8.1f} ms\n"
+        f"          worker pickup after publish p50={statistics.median(pickup_ms):8.1f} ms "
+        f"max={max(pickup_ms):8.1f} ms\n"
+        f"          of which snapshot load p50={statistics.median(load_ms):8.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Catalog snapshot memory + swap benchmark")
+    parser.add_argument("--meds", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--poll-ms", type=float, default=10.0, help="request interval in swap workers")
+    args = parser.parse_args()
+
+    from app import db
+
+    meds = synthetic_catalog(args.meds)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalog.snap")
+        snapshot.write_snapshot(path, meds, db.USERS)
+        print(f"snapshot: {os.path.getsize(path) / 1024 / 1024:.1f} MiB on disk")
+        bench_memory(args.meds, args.workers, path)
+        bench_swap(meds, db.USERS, path, args.rounds, args.workers, args.poll_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# tests/test_snapshot.py
+# Round-trip checks for the mmap catalog snapshot: tools must return exactly what
+# they return from the in-memory db, across generation swaps and bad files.
+import copy
+import itertools
+import logging
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from app import db, snapshot, tools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOOL_CALLS = [
+    ("get_medication", ("panadol",)),
+    ("get_medication", ("  Can I get ZESTRIL   today?",)),
+    ("get_medication", ("advil or tylenol",)),
+    ("get_medication", ("aspirin",)),
+    ("get_medication", ("",)),
+    ("get_user_prescriptions", ("u001",)),
+    ("get_user_prescriptions", ("u005",)),
+    ("get_user_prescriptions", ("u999",)),
+    ("get_user_prescriptions", ("",)),
+] + [
+    ("list_medications", (rx, stock))
+    for rx, stock in itertools.product(
+        ("rx", "non_rx", "both", None), ("in_stock", "out_of_stock", "both", None)
+    )
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Every test starts with no active snapshot and checks the file on every call."""
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PATH", "")
+    monkeypatch.setattr(snapshot, "CHECK_SECONDS", 0.0)
+    monkeypatch.setattr(snapshot, "_active", None)
+    monkeypatch.setattr(snapshot, "_next_check", 0.0)
+    monkeypatch.setattr(snapshot, "_warned", False)
+    monkeypatch.setattr(snapshot, "_rejected", None)
+
+
+@pytest.fixture
+def snap_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.snap")
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PATH", path)
+    return path
+
+
+def _run_tools() -> list[dict]:
+    return [getattr(tools, name)(*args) for name, args in TOOL_CALLS]
+
+
+def _catalog(n: int) -> list[dict]:
+    """n meds with mixed flags, so bitsets span several bytes and end mid-byte."""
+    meds = []
+    for i in range(n):
+        med = copy.deepcopy(db.MEDS[i % len(db.MEDS)])
+        med["medication_id"] = f"x{i:03d}"
+        med["rx_required"] = i % 3 == 0
+        med["in_stock"] = i % 4 != 1
+        meds.append(med)
+    return meds
+
+
+def test_tools_match_in_memory_db(snap_path):
+    expected = _run_tools()
+    snapshot.write_snapshot(snap_path, db.MEDS, db.USERS)
+
+    assert isinstance(snapshot.current(), snapshot.Snapshot)
+    assert _run_tools() == expected
+
+
+def test_snapshot_views_round_trip(tmp_path):
+    meds = _catalog(37)
+    path = str(tmp_path / "catalog.snap")
+    snapshot.write_snapshot(path, meds, db.USERS)
+    snap = snapshot.Snapshot(path)
+
+    assert list(snap.meds()) == meds
+    assert snap.users() == db.USERS
+    for med in meds:
+        assert snap.med_by_id(med["medication_id"]) == med
+    for user in db.USERS:
+        assert snap.user_by_id(user["user_id"]) == user
+    assert snap.med_by_id("nope") is None
+    assert snap.user_by_id("nope") is None
+
+    for rx, stock in itertools.product((True, False, None), repeat=2):
+        expected = [
+            m for m in meds
+            if (rx is None or m["rx_required"] == rx) and (stock is None or m["in_stock"] == stock)
+        ]
+        assert list(snap.filter_meds(rx, stock)) == expected, (rx, stock)
+
+
+def test_published_snapshot_is_world_readable(snap_path):
+    old_umask = os.umask(0o022)
+    try:
+        snapshot.write_snapshot(snap_path, db.MEDS, db.USERS)
+    finally:
+        os.umask(old_umask)
+
+    mode = stat.S_IMODE(os.stat(snap_path).st_mode)
+    assert mode == 0o644
+    assert mode & stat.S_IRGRP and mode & stat.S_IROTH
+
+
+def test_generation_swap(snap_path):
+    meds = copy.deepcopy(db.MEDS)
+    assert snapshot.write_snapshot(snap_path, meds, db.USERS) == 1
+    old = snapshot.current()
+    assert old.generation == 1
+
+    meds[0]["in_stock"] = False
+    assert snapshot.write_snapshot(snap_path, meds, db.USERS) == 2
+    new = snapshot.current()
+
+    assert new.generation == 2
+    assert new.med_by_id("m001")["in_stock"] is False
+    # A request still holding the previous generation keeps reading it.
+    assert old.med_by_id("m001")["in_stock"] is True
+
+
+@pytest.mark.parametrize("name, args", TOOL_CALLS)
+def test_tool_call_reads_one_generation(snap_path, monkeypatch, name, args):
+    snapshot.write_snapshot(snap_path, db.MEDS, db.USERS)
+    fetches = []
+    real_current = snapshot.current
+    monkeypatch.setattr(snapshot, "current", lambda: fetches.append(1) or real_current())
+
+    getattr(tools, name)(*args)
+    assert len(fetches) == 1
+
+    # A catalog passed in by the caller (e.g. for a whole chat turn) is used as-is.
+    fetches.clear()
+    getattr(tools, name)(*args, catalog=real_current())
+    assert fetches == []
+
+
+def test_missing_snapshot_falls_back_and_warns_once(snap_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="app.snapshot"):
+        for _ in range(3):
+            assert isinstance(snapshot.current(), snapshot.MemoryCatalog)
+        in_memory = [m["medication_id"] for m in tools.list_medications(None, None)["medications"]]
+        assert in_memory == [m["medication_id"] for m in db.MEDS]
+
+    assert len(caplog.records) == 1
+
+
+@pytest.mark.parametrize("damage", ["garbage", "truncated"])
+def test_corrupt_snapshot_is_rejected(snap_path, caplog, damage):
+    snapshot.write_snapshot(snap_path, db.MEDS, db.USERS)
+    good = snapshot.current()
+    assert good.generation == 1
+
+    with open(snap_path, "rb") as f:
+        data = f.read()
+    bad = b"not a snapshot" * 10 if damage == "garbage" else data[:-1]
+    tmp = snap_path + ".bad"
+    with open(tmp, "wb") as f:
+        f.write(bad)
+    os.replace(tmp, snap_path)
+
+    with caplog.at_level(logging.WARNING, logger="app.snapshot"):
+        for _ in range(3):
+            assert snapshot.current() is good
+    assert len(caplog.records) == 1
+
+    # With nothing loaded yet, a bad file falls back to the in-memory db.
+    snapshot._active = None
+    snapshot._rejected = None
+    assert isinstance(snapshot.current(), snapshot.MemoryCatalog)
+
+
+def test_snapshot_worker_does_not_import_db(snap_path):
+    snapshot.write_snapshot(snap_path, db.MEDS, db.USERS)
+    code = (
+        "import sys\n"
+        "from app import tools, snapshot\n"
+        "assert tools.get_user_prescriptions('u001')['ok']\n"
+        "assert tools.list_medications('rx', None)['medications']\n"
+        "assert snapshot.current().users()\n"
+        "assert 'app.db' not in sys.modules\n"
+    )
+    env = dict(os.environ, CATALOG_SNAPSHOT=snap_path)
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)